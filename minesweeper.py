@@ -4,6 +4,7 @@
 
 import random
 import time
+from collections import deque
 import tkinter as tk
 try:
     import tkinter.font as tkfont
@@ -11,6 +12,17 @@ try:
 except ModuleNotFoundError:
     pass
 
+# Set to True to log cell clicks to stdout (useful for debugging).
+VERBOSE = False
+
+# Width and height of a cell on the board, in pixels.
+CELL_SIZE = 30
+
+# Row/column offsets of the eight neighbors of a square.
+_OFFSETS = ((-1, -1), (-1, 0), (-1, 1),
+            (0, -1),           (0, 1),
+            (1, -1),  (1, 0),  (1, 1))
+
 # Square Class ################################################################
 
 class Square():
@@ -72,7 +84,14 @@ class GameGrid:
         - nflags: the number of flags currently placed
         - tab: a list of nrows lists, each of ncols Square objects
         - squares_revealed: the number of Squares that have been revealed
+        - mine_revealed: True iff a mined Square has been revealed
+        - flag_counts: a list of nrows lists, each of ncols counts of
+                       flags placed on neighboring Squares
     Note that (0,0) is the top left position.
+    Note that mine_revealed and flag_counts are kept up to date by the
+    GameGrid methods, so the Squares in tab should only be mined, flagged
+    or revealed through those methods: game_lost and flags_nearby do not
+    see changes made to the Squares directly.
     """
 
     def __init__(self, nrows, ncols):
@@ -83,30 +102,29 @@ class GameGrid:
         self.tab = [[Square(i, j) for j in range(self.ncols)]
                     for i in range(self.nrows)]
         self.squares_revealed = 0
+        self.mine_revealed = False
+        self.flag_counts = [[0] * ncols for i in range(nrows)]
+        # Neighboring positions of every Square, computed once: interior
+        # Squares then need no bounds checks on the hot paths.
+        self._nbrs = [[tuple((i+dr, j+dc) for dr, dc in _OFFSETS
+                             if 0 <= i+dr < nrows and 0 <= j+dc < ncols)
+                       for j in range(ncols)]
+                      for i in range(nrows)]
 
     def __str__(self):
         """Useful for debugging"""
-        lines = [''.join([str(sq) for sq in line]) for line in self.tab]
-        return '\n'.join(lines)
+        return '\n'.join(''.join(map(str, line)) for line in self.tab)
 
     def str_for_player(self):
         """Useful for debugging"""
-        lines = [''.join([sq.str_for_player() for sq in line]) for line in self.tab]
-        return '\n'.join(lines)
+        return '\n'.join(''.join(map(Square.str_for_player, line))
+                         for line in self.tab)
 
     def neighbors(self, i, j):
-        """Returns a list of tuples (x, y) of valid
+        """Returns a tuple of tuples (x, y) of valid
         neighboring positions; the order does not matter
         """
-        ls = []
-        for m in {-1,0,1}:
-            for l in {-1,0,1}:
-                if m == l and m == 0:
-                    continue
-                if i+m >= 0 and i+m < self.nrows and j+l >= 0 and j+l < self.ncols:
-                    ls.append((i+m,j+l))
-        return ls
-                
+        return self._nbrs[i][j]
 
     def game_won(self):
         """True iff the game has been won:
@@ -116,12 +134,10 @@ class GameGrid:
         return (not self.game_lost()) and (self.nrows * self.ncols - self.squares_revealed) == self.nmines
 
     def game_lost(self):
-        """True iff at least one mine is revealed"""
-        for i in range(self.nrows):
-            for j in range(self.ncols):
-                if self.mine_at(i, j) and self.is_revealed(i, j):
-                    return True
-        return False
+        """True iff at least one mine is revealed, as recorded by reveal
+        and place_mine in mine_revealed.
+        """
+        return self.mine_revealed
 
     def square_at(self, i, j):
         """The square at position (i, j)."""
@@ -135,30 +151,95 @@ class GameGrid:
         self.nmines = 0
         self.nflags = 0
         self.squares_revealed = 0
+        self.mine_revealed = False
+        for counts in self.flag_counts:
+            counts[:] = [0] * self.ncols
 
     def reveal(self, i, j):
         """Reveal the square at (x,y);
-        if there are no mines nearby, reveals all the neighbors
+        if there are no mines nearby, reveals all the neighbors.
+        Empty regions are filled one horizontal run at a time (scanline
+        fill), seeding only the rows directly above and below each run,
+        so large empty regions cannot hit the recursion limit.
+        Returns the list of positions (x, y) that were newly revealed.
         """
-        if self.is_revealed(i,j) or self.is_flagged(i,j):
-            return None
-        square = self.square_at(i,j)
-        square.revealed = True
-        self.squares_revealed += 1
-        if square.mined == False and self.mines_nearby(i,j) == 0:
-            for neighbor in self.neighbors(i,j):
-                x, y = neighbor
-                self.reveal(x,y)
+        tab = self.tab
+        ncols = self.ncols
+        last_row = self.nrows - 1
+        last_col = ncols - 1
+        revealed = []
+        seeds = deque([(i, j)])
+        while seeds:
+            x, y = seeds.popleft()
+            row = tab[x]
+            square = row[y]
+            if square.revealed or square.flagged:
+                continue
+            square.revealed = True
+            revealed.append((x, y))
+            if square.mined:
+                self.mine_revealed = True
+                continue
+            if square.mines_nearby != 0:
+                continue
+            # Extend the run of empty squares to the left and right.
+            left = y
+            while left > 0:
+                sq = row[left - 1]
+                if sq.revealed or sq.flagged or sq.mines_nearby != 0:
+                    break
+                left -= 1
+                sq.revealed = True
+                revealed.append((x, left))
+            right = y
+            while right < last_col:
+                sq = row[right + 1]
+                if sq.revealed or sq.flagged or sq.mines_nearby != 0:
+                    break
+                right += 1
+                sq.revealed = True
+                revealed.append((x, right))
+            # The run is bordered by numbered squares, reveal those too.
+            lo = left - 1 if left > 0 else 0
+            hi = right + 1 if right < last_col else last_col
+            for ny in (lo, hi):
+                sq = row[ny]
+                if not sq.revealed and not sq.flagged:
+                    sq.revealed = True
+                    revealed.append((x, ny))
+            # Scan the rows above and below: numbered squares are revealed
+            # directly, each run of empty squares gets a single seed.
+            for nx in (x - 1, x + 1):
+                if nx < 0 or nx > last_row:
+                    continue
+                nrow = tab[nx]
+                in_run = False
+                for ny in range(lo, hi + 1):
+                    sq = nrow[ny]
+                    if sq.revealed or sq.flagged:
+                        in_run = False
+                    elif sq.mines_nearby != 0:
+                        sq.revealed = True
+                        revealed.append((nx, ny))
+                        in_run = False
+                    elif not in_run:
+                        seeds.append((nx, ny))
+                        in_run = True
+        self.squares_revealed += len(revealed)
+        return revealed
 
     def chording(self, i, j):
         """If the number of flags nearby does not coincide
         with the number mines nearby, does nothing.
-        Otherwise, reveals all the non-flagged neighbors
+        Otherwise, reveals all the non-flagged neighbors.
+        Returns the list of positions (x, y) that were newly revealed.
         """
+        revealed = []
         if self.flags_nearby(i,j) == self.mines_nearby(i,j):
-            for neighbor in self.neighbors(i,j):
+            for neighbor in self._nbrs[i][j]:
                 x,y = neighbor
-                self.reveal(x,y)
+                revealed.extend(self.reveal(x,y))
+        return revealed
 
     def is_revealed(self, i, j):
         """True iff the Square at (i, j) has been revealed."""
@@ -176,6 +257,9 @@ class GameGrid:
         if not square.flagged:
             square.flagged = True
             self.nflags += 1
+            flag_counts = self.flag_counts
+            for x, y in self._nbrs[i][j]:
+                flag_counts[x][y] += 1
 
     def remove_flag(self, i, j):
         """If there is flag at (i,j) then remove it,
@@ -185,6 +269,9 @@ class GameGrid:
         if square.flagged:
             square.flagged = False
             self.nflags -= 1
+            flag_counts = self.flag_counts
+            for x, y in self._nbrs[i][j]:
+                flag_counts[x][y] -= 1
 
     def mine_at(self, i, j):
         """True iff there is a mine in the Square at (x,y)."""
@@ -195,34 +282,42 @@ class GameGrid:
         return self.square_at(i, j).mines_nearby
 
     def flags_nearby(self, i, j):
-        count = 0
-        for neighbor in self.neighbors(i,j):
-            x,y = neighbor
-            square = self.square_at(x,y)
-            if square.flagged:
-                count += 1
-        return count
+        """The number of flags near (i, j), as counted by place_flag
+        and remove_flag.
+        """
+        return self.flag_counts[i][j]
 
     def place_mine(self, i, j):
         """If there is a mine at (i, j), does nothing;
         Otherwise, places a mine at (i, j) and increments
         mines_nearby for all the neighbors
         """
-        if self.tab[i][j].mined == True:
+        if self.tab[i][j].mined:
             return None
-        else:
-            self.tab[i][j].mined = True
-            for neighbor in self.neighbors(i,j):
-                x,y = neighbor
-                self.tab[x][y].mines_nearby += 1
+        self._lay_mine(i, j)
         self.nmines += 1
+        if self.tab[i][j].revealed:
+            self.mine_revealed = True
             
 
     def random_game(self, n_mines):
         """Reset the game grid and place n_mines random mines."""
         self.reset()
-        for x,y in random.sample([(i,j) for j in range(self.ncols) for i in range(self.nrows)],n_mines):
-            self.place_mine(x,y)
+        # The sampled positions are distinct and the grid is blank, so the
+        # mines can be laid down directly without place_mine's checks.
+        ncols = self.ncols
+        for idx in random.sample(range(self.nrows * ncols), n_mines):
+            self._lay_mine(*divmod(idx, ncols))
+        self.nmines = n_mines
+
+    def _lay_mine(self, i, j):
+        """Place a mine at (i, j), which must not already be mined, and
+        update the state of its neighbors; nmines is left to the caller.
+        """
+        tab = self.tab
+        tab[i][j].mined = True
+        for x, y in self._nbrs[i][j]:
+            tab[x][y].mines_nearby += 1
             
         
 
@@ -236,14 +331,24 @@ class MinesweeperApp:
         - started: True if the game has already started (that is, 
                    the first click has been made)
         - root: a Tk display
-        - board: the array of buttons to be clicked on
+        - board: the array of cells to be clicked on; each cell is a tuple
+                 of the ids of its tile, image and text canvas items, with
+                 the tag shared by its two bevel lines after the tile
+        - cell_shown: the array of cell_styles keys the cells are drawn in
         - flag_image: a picture of a flag
         - mine_image: a picture of a mine
-        - game_frame: the tkinter frame with the buttons
+        - cell_font: the bold font of the mine counts on the board, also
+                     used by the mine counter
+        - cell_styles: the tile, bevel, image and text item options for
+                       each way a cell can look, keyed by 'hidden', 'flag',
+                       'mine' or mines nearby
+        - game_frame: the tkinter frame with the canvas
+        - canvas: the tkinter canvas the cells are drawn on
         - top_frame: the tkinter frame with the counters
         - mine_counter: the tkinter label with the mine counter
         - mine_counter_str: the corresponding tkinter string
         - time_counter, time_counter_str - the same for time
+        - time_shown: the time currently displayed by the time counter
     """
 
     def __init__(self, game):
@@ -256,12 +361,44 @@ class MinesweeperApp:
         self.root.resizable(width=False, height=False)
         self.flag_image = tk.PhotoImage(file='flag.gif')
         self.mine_image = tk.PhotoImage(file='mine.gif')
-
-        # Create and set up game frame
+        self.cell_font = tkfont.Font(weight='bold', size=10)
+        # Raised tiles show a light top/left and dark bottom/right bevel;
+        # sunken tiles are flat and darker.
+        raised = (dict(fill='#d9d9d9'), dict(state='normal'))
+        sunken = (dict(fill='#b3b3b3'), dict(state='hidden'))
+        no_image = dict(image='', state='hidden')
+        no_text = dict(text='', state='hidden')
+        self.cell_styles = {
+            'hidden': raised + (no_image, no_text),
+            'flag': raised + (dict(image=self.flag_image, state='normal'),
+                              no_text),
+            'mine': sunken + (dict(image=self.mine_image, state='normal'),
+                              no_text),
+            0: sunken + (no_image, no_text),
+        }
+        for k in range(1, 9):
+            self.cell_styles[k] = sunken + (no_image,
+                                            dict(text=str(k), state='normal'))
+
+        # Create and set up game frame, with a single canvas holding the
+        # items of every cell.
         self.game_frame = tk.Frame(self.root, borderwidth=2, relief=tk.SUNKEN)
-
+        self.canvas = tk.Canvas(self.game_frame,
+                                width=self.game.ncols * CELL_SIZE,
+                                height=self.game.nrows * CELL_SIZE,
+                                borderwidth=0,
+                                highlightthickness=0)
+        self.canvas.pack()
+        # Register the callbacks for mouse click events on all cells
+        self.canvas.bind('<Button-1>', self._on_left_click)
+        self.canvas.bind('<Button-3>', self._on_right_click)
+
+        # Cells are created looking 'hidden', so draw_board only has to
+        # update the ones that differ.
         self.board = [[self.make_cell(i, j) for j in range(self.game.ncols)]
                       for i in range(self.game.nrows)]
+        self.cell_shown = [['hidden'] * self.game.ncols
+                           for i in range(self.game.nrows)]
         self.game_frame.pack(padx=10, pady=10, side=tk.BOTTOM)
         self.draw_board()
 
@@ -283,7 +420,7 @@ class MinesweeperApp:
                                 width=4,
                                 bg='white',
                                 textvariable=self.mine_counter_str,
-                                font=tkfont.Font(weight='bold', size=10))
+                                font=self.cell_font)
         self.mine_counter.grid(row=0, column=0, padx=5, sticky=tk.W)
         self.update_mine_counter()
 
@@ -300,6 +437,7 @@ class MinesweeperApp:
         self.t_0 = time.time()
         self.time_counter_str = tk.StringVar()
         self.time_counter_str.set('TIME')
+        self.time_shown = None
         self.time_counter = tk.Label(self.top_frame,
                                 height=1,
                                 width=4,
@@ -313,81 +451,99 @@ class MinesweeperApp:
         self.root.mainloop()
 
     def make_cell(self, i, j):
-        """Make a 30x30 Frame holding a Button corresponding to a Square
-        at (i,j) in the GameGrid.
+        """Make the canvas items of a CELL_SIZE x CELL_SIZE cell
+        corresponding to a Square at (i,j) in the GameGrid: a tile with a
+        bevel (light and dark edges), and an image and a text on top,
+        all drawn as a 'hidden' cell.
         """
-        # First, create a 30x30 frame within to hold a button object.
-        # This provides a rigid piece of screen real estate for the button,
-        # and prevents awkward resizing when we change the text or image.
-        # image in the button.
-        cell_frame = tk.Frame(self.game_frame, height=30, width=30)
-        cell_frame.pack_propagate(False)
-        cell_frame.grid(row=i, column=j)
-
-        # Now set up the new button within the new frame:
-        cell_button = tk.Button(cell_frame,
-                                borderwidth=1,
-                                state='normal',
-                                disabledforeground='#000000')
-        cell_button.pack(fill=tk.BOTH, expand=True)
-        
-        # NOTE FROM PROF. SMITH FOR CODING THE ADD CELL METHOD
-        # Tkinter allows us to "bind" a function f (say) to an event such
-        # as a mouse being clicked on this Button.  But that function
-        # must take the event object as an argument (and some other keyword
-        # arguments that we're not very interested in...)  So we are forced
-        # to define a no-argument function to "wrap" the functionality we
-        # want, supplying any missing arguments from the current context.
-        # For example: we want to call the method left_click_handler(i, j)
-        # when the mouse is left-clicked over (i, j).  So we need a wrapper
-        # function _on_left_click(event) to call left_click_handler(i, j).
-        # (It's traditional to use the lambda construction for the wrapper,
-        # but since we haven't covered that in class yet, we'll just define
-        # the functions using def...  See Lecture E.)
-        def _on_left_click(event):
-            print(f'left click in cell {(i, j)}')
-            self.left_click_handler(i, j)
-
-        def _on_right_click(event):
-            print(f'right click in cell {(i, j)}')
-            self.right_click_handler(i, j)
-
-        # Register the callbacks for mouse click events:
-        cell_button.bind('<Button-1>', _on_left_click)
-        cell_button.bind('<Button-3>', _on_right_click)
-        return cell_button
+        canvas = self.canvas
+        tile_options, bevel_options, image_options, text_options = \
+            self.cell_styles['hidden']
+        bevel = f'bevel_{i}_{j}'
+        x, y = j * CELL_SIZE, i * CELL_SIZE
+        x_end, y_end = x + CELL_SIZE - 1, y + CELL_SIZE - 1
+        centre_x, centre_y = x + CELL_SIZE // 2, y + CELL_SIZE // 2
+        tile = canvas.create_rectangle(x, y, x_end, y_end,
+                                       outline='#808080', **tile_options)
+        canvas.create_line(x + 2, y_end - 2, x + 2, y + 2, x_end - 2, y + 2,
+                           fill='#ffffff', width=2, tags=bevel,
+                           **bevel_options)
+        canvas.create_line(x_end - 2, y + 2, x_end - 2, y_end - 2,
+                           x + 2, y_end - 2,
+                           fill='#6e6e6e', width=2, tags=bevel,
+                           **bevel_options)
+        image = canvas.create_image(centre_x, centre_y, **image_options)
+        text = canvas.create_text(centre_x, centre_y, font=self.cell_font,
+                                  **text_options)
+        return tile, bevel, image, text
+
+    def cell_at(self, event):
+        """The position (i, j) of the cell under the mouse for a canvas
+        event, or None if the event is outside the board.
+        """
+        i = int(self.canvas.canvasy(event.y)) // CELL_SIZE
+        j = int(self.canvas.canvasx(event.x)) // CELL_SIZE
+        if 0 <= i < self.game.nrows and 0 <= j < self.game.ncols:
+            return i, j
+        return None
+
+    def _on_left_click(self, event):
+        """Dispatch a left-click on the board to left_click_handler."""
+        cell = self.cell_at(event)
+        if cell is None:
+            return
+        if VERBOSE:
+            print(f'left click in cell {cell}')
+        self.left_click_handler(*cell)
+
+    def _on_right_click(self, event):
+        """Dispatch a right-click on the board to right_click_handler."""
+        cell = self.cell_at(event)
+        if cell is None:
+            return
+        if VERBOSE:
+            print(f'right click in cell {cell}')
+        self.right_click_handler(*cell)
 
     def update_mine_counter(self):
-        """Updates mine counter and schedules the next update in 100 ms"""
+        """Updates mine counter; to be called whenever flags are changed"""
         self.mine_counter_str.set(self.game.nmines - self.game.nflags)
-        self.top_frame.after(100, self.update_mine_counter) 
 
     def update_time_counter(self):
-        """Updated the time counter and schedules the next update in 100ms"""
-        self.time_counter_str.set(self.game_time())
-        self.top_frame.after(100, self.update_time_counter)
+        """Updates the time counter if the elapsed time has changed and
+        schedules the next update in 250 ms
+        """
+        game_time = self.game_time()
+        if game_time != self.time_shown:
+            self.time_shown = game_time
+            self.time_counter_str.set(game_time)
+        self.top_frame.after(250, self.update_time_counter)
 
     def draw_cell(self, i, j):
         """Draws the cell with coordinates (i, j)"""
-        cell = self.board[i][j]
-        cell['image'] = ''
-        cell['text'] = ''
-        if self.game.is_revealed(i, j):
-            cell['relief'] = tk.SUNKEN
-            if self.game.mine_at(i, j):
-                cell['image'] = self.mine_image
-                cell['state'] = 'normal'
+        game = self.game
+        if game.is_revealed(i, j):
+            if game.mine_at(i, j):
+                style = 'mine'
             else:
-                mines_nearby = self.game.mines_nearby(i, j)
-                cell['text'] = '' if mines_nearby == 0 else mines_nearby
-                cell['state'] = 'disabled'
+                style = game.mines_nearby(i, j)
+        elif game.is_flagged(i, j):
+            style = 'flag'
         else:
-            cell['relief'] = tk.RAISED
-            if self.game.is_flagged(i, j):
-                cell['image'] = self.flag_image
-                cell['state'] = 'normal'
-            else:
-                cell['state'] = 'disabled'
+            style = 'hidden'
+        shown = self.cell_shown[i]
+        if shown[j] == style:
+            return
+        old_styles = self.cell_styles[shown[j]]
+        shown[j] = style
+        # Styles share their option dicts, so only the items whose dict
+        # differs need to be reconfigured.
+        itemconfigure = self.canvas.itemconfigure
+        for item, options, old_options in zip(self.board[i][j],
+                                              self.cell_styles[style],
+                                              old_styles):
+            if options is not old_options:
+                itemconfigure(item, **options)
 
     def draw_board(self):
         """Draws the board"""
@@ -404,6 +560,7 @@ class MinesweeperApp:
         self.game.reset()
         self.draw_board()
         self.game.random_game(nmines)
+        self.update_mine_counter()
         self.t_0 = time.time()
         self.started = False
 
@@ -437,7 +594,7 @@ class MinesweeperApp:
         - If (i, j) is revealed, then chording is performed
         - If (i, j) is flagged, then nothing happens
         - If (i,j) is not revealed and not flagged, and reveals (i,j).
-        Note that the board should be redrawn
+        Note that the newly revealed cells are redrawn
         """
         if not self.started:
             self.t_0 = time.time()
@@ -447,12 +604,14 @@ class MinesweeperApp:
             return None
         
         elif self.game.is_revealed(i,j):
-            self.game.chording(i,j)
+            revealed = self.game.chording(i,j)
         
         else:
-            self.game.reveal(i,j)
+            revealed = self.game.reveal(i,j)
             
-        self.draw_board()
+        # Only the newly revealed cells have changed.
+        for x, y in revealed:
+            self.draw_cell(x, y)
         if self.game.game_lost():
             self.game_over(False)
         if self.game.game_won():
@@ -473,6 +632,7 @@ class MinesweeperApp:
         else:
             self.game.remove_flag(i, j)
         self.draw_cell(i, j)
+        self.update_mine_counter()
         
 
 if __name__ == "__main__":